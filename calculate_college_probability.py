@@ -1,12 +1,42 @@
+from functools import lru_cache
+from math import erf, sqrt
 from scipy.stats import norm
+from scipy.special import ndtri, erf as erf_vec
 import json
-from statistics import NormalDist
+import numpy as np
 import csv
 
 
 _colleges = None
 _sat_lookup = None
-normal = NormalDist()  # standard normal
+_sat_z_lookup = None
+_acc_rate_lookup = None
+_z_school_lookup = None
+_admit_table = None
+
+# Grid the student z-score is discretized onto for the per-school admission
+# probability lookup tables (step 0.005 over [-4, 4])
+_Z_GRID_LO = -4.0
+_Z_GRID_STEP = 0.005
+_Z_GRID_SIZE = 1601
+
+# Bucket grids for fast_probability: gpa percentile and essay score are
+# floored onto these grids so their z-scores come from precomputed tables.
+# Storing z per input component instead of a dense
+# school x sat x gpa x essay probability table keeps memory tiny while the
+# query stays pure integer indexing.
+_GPA_BUCKETS = 100
+_ESSAY_LO = 700
+_ESSAY_HI = 1400
+_ESSAY_STEP = 10
+_gpa_grid_z = None
+_essay_grid_z = None
+
+
+def _cdf(x):
+    """Standard normal CDF via the C erf intrinsic (scalar-fast, unlike the
+    pure-Python statistics.NormalDist)."""
+    return 0.5 * (1.0 + erf(x * 0.7071067811865476))
 
 
 # School: name, acceptance rate,
@@ -14,13 +44,16 @@ normal = NormalDist()  # standard normal
 # SAT score and GPA in percentile, essay score as raw number (gets mapped)
 
 
-def get_essay_percentile(essay_score):
-    essay_score_mean = 1032.45
-    essay_score_std_dev = 66.52
+# Essay score distribution parameters, folded into one multiplier so the
+# scalar path is a single C erf call with no SciPy dispatch overhead
+_ESSAY_MEAN = 1032.45
+_ESSAY_SCALE = 1.0 / (66.52 * sqrt(2.0))
 
-    p = norm.cdf(essay_score, loc=essay_score_mean, scale=essay_score_std_dev)
 
-    return p
+def get_essay_percentile(essay_score):
+    if isinstance(essay_score, np.ndarray):
+        return 0.5 * (1.0 + erf_vec((essay_score - _ESSAY_MEAN) * _ESSAY_SCALE))
+    return 0.5 * (1.0 + erf((essay_score - _ESSAY_MEAN) * _ESSAY_SCALE))
 
 
 def get_sat_percentile(sat_score):  # Assumes SAT is divisible by 10
@@ -31,13 +64,13 @@ def get_sat_percentile(sat_score):  # Assumes SAT is divisible by 10
     return _sat_lookup[sat_score] / 100
 
 
-def get_probability(school, sat_score, gpa_percentile, essay_score):
-
-    global _colleges, _sat_lookup
-    if _colleges is None or _sat_lookup is None:
-        _load_data()
-    sat_percentile = get_sat_percentile(sat_score)
-
+@lru_cache(maxsize=4096)
+def _z_student(sat_score, gpa_percentile, essay_score):
+    """
+    z-score for the student's combined profile. Cached because MCTS rollouts
+    re-evaluate the same (sat, gpa, essay) triplet against many schools;
+    callers quantize gpa/essay so cache hits are frequent.
+    """
     # weightings:
     w_sat = 0.25
     w_gpa = 0.25
@@ -46,26 +79,31 @@ def get_probability(school, sat_score, gpa_percentile, essay_score):
     essay_percentile = get_essay_percentile(essay_score)
     # Clamp percentiles to (0,1) to avoid inv_cdf domain errors
     eps = 1e-6
-    sat_percentile = min(1.0 - eps, max(eps, sat_percentile))
     gpa_percentile = min(1.0 - eps, max(eps, gpa_percentile))
     essay_percentile = min(1.0 - eps, max(eps, essay_percentile))
 
-    z_sat = normal.inv_cdf(sat_percentile)
-    z_gpa = normal.inv_cdf(gpa_percentile)
-    z_essay = normal.inv_cdf(essay_percentile)
-
-    z_student = z_sat * w_sat + z_gpa * w_gpa + z_essay * w_essay
+    # SAT scores are discrete, so the z-score was precomputed at load time
+    z_sat = _sat_z_lookup[sat_score]
+    z_gpa = ndtri(gpa_percentile)
+    z_essay = ndtri(essay_percentile)
 
-    student_total_percentile = normal.cdf(z_student)
+    # student_total_percentile = sat_score * 0.25 + gpa_score * 0.25 + essay_percentile * 0.5 #TODO distributions don't work like this
 
-    # print(f"Student percentile: {student_total_percentile}")
+    return z_sat * w_sat + z_gpa * w_gpa + z_essay * w_essay
 
-    # student_total_percentile = sat_score * 0.25 + gpa_score * 0.25 + essay_percentile * 0.5 #TODO distributions don't work like this
-    lookup = {c["name"]: c["acceptance_rate"] for c in _colleges}
 
-    school_acceptance_rate = lookup[school] / 100
+def get_probabilities(schools, sat_score, gpa_percentile, essay_score):
+    """
+    Vectorized admission probabilities for a list of schools.
+    The student inputs are scalars shared across all schools; returns an
+    np.ndarray of probabilities aligned with `schools`.
+    """
+    global _colleges, _sat_lookup
+    if _colleges is None or _sat_lookup is None:
+        _load_data()
 
-    z_school = normal.inv_cdf(1 - school_acceptance_rate)
+    # Quantize the continuous inputs so repeated MCTS states hit the cache
+    z_student = _z_student(sat_score, round(gpa_percentile, 3), round(essay_score, 3))
 
     # 5% acceptance rate: 0.02 standard dev
     # 50% acceptance rate: 0.1 standard dev
@@ -74,19 +112,99 @@ def get_probability(school, sat_score, gpa_percentile, essay_score):
     # 0.01 = 0.05 * -0.422 + b
     # b = 0.0311
 
-    school_standard_dev = -0.422 * school_acceptance_rate + 0.0311
+    # Index the precomputed per-school tables: one array load per school
+    # instead of recomputing the cdf
+    zi = int(round((z_student - _Z_GRID_LO) / _Z_GRID_STEP))
+    zi = min(_Z_GRID_SIZE - 1, max(0, zi))
+    return np.array([_admit_table[school][zi] for school in schools])
 
-    admissions_probability = 1 - normal.cdf((z_school - z_student) / 0.5)
 
-    return admissions_probability
+def get_probability(school, sat_score, gpa_percentile, essay_score):
+    return float(get_probabilities([school], sat_score, gpa_percentile, essay_score)[0])
+
+
+def get_probability_vec(schools, sat_score, gpa_percentile, essay_scores):
+    """
+    Admission probabilities for many schools with per-school essay scores.
+    sat_score and gpa_percentile are scalars; essay_scores is an array
+    aligned with `schools`. One vectorized pass replaces a Python
+    get_probability call per school.
+    """
+    if _colleges is None or _sat_lookup is None:
+        _load_data()
+
+    eps = 1e-6
+    gpa_percentile = min(1.0 - eps, max(eps, gpa_percentile))
+    essay_pct = np.clip(
+        get_essay_percentile(np.asarray(essay_scores, dtype=np.float64)),
+        eps,
+        1.0 - eps,
+    )
+    z_student = (
+        0.25 * _sat_z_lookup[sat_score]
+        + 0.25 * ndtri(gpa_percentile)
+        + 0.5 * ndtri(essay_pct)
+    )
+    zi = np.clip(
+        np.rint((z_student - _Z_GRID_LO) / _Z_GRID_STEP).astype(np.int64),
+        0,
+        _Z_GRID_SIZE - 1,
+    )
+    return np.array([_admit_table[school][i] for school, i in zip(schools, zi)])
+
+
+def fast_probability(school, sat_score, gpa_percentile, essay_score):
+    """
+    Table-only admission probability for hot loops (e.g. MCTS rollouts):
+    every input is floored onto a precomputed grid, so a query is a handful
+    of integer index operations with no cdf/inv_cdf calls at all.
+    """
+    if _colleges is None or _sat_lookup is None:
+        _load_data()
+
+    gi = min(_GPA_BUCKETS - 1, max(0, int(gpa_percentile * _GPA_BUCKETS)))
+    ei = min(
+        len(_essay_grid_z) - 1, max(0, (int(essay_score) - _ESSAY_LO) // _ESSAY_STEP)
+    )
+    z_student = (
+        0.25 * _sat_z_lookup[sat_score]
+        + 0.25 * _gpa_grid_z[gi]
+        + 0.5 * _essay_grid_z[ei]
+    )
+    zi = int(round((z_student - _Z_GRID_LO) / _Z_GRID_STEP))
+    zi = min(_Z_GRID_SIZE - 1, max(0, zi))
+    return _admit_table[school][zi]
 
 
 def _load_data():
     """Lazy-load data to avoid import-time side effects."""
-    global _colleges, _sat_lookup
+    global _colleges, _sat_lookup, _sat_z_lookup, _acc_rate_lookup, _z_school_lookup, _admit_table
+    global _gpa_grid_z, _essay_grid_z
+    if _gpa_grid_z is None:
+        # z-scores per bucketed gpa percentile / essay score for fast_probability
+        eps = 1e-6
+        # bucket lower edges, so on-grid inputs round-trip exactly
+        gpa_grid = np.clip(np.arange(_GPA_BUCKETS) / _GPA_BUCKETS, eps, 1.0 - eps)
+        _gpa_grid_z = ndtri(gpa_grid)
+        essay_grid = np.arange(_ESSAY_LO, _ESSAY_HI + 1, _ESSAY_STEP, dtype=np.float64)
+        essay_pct = get_essay_percentile(essay_grid)
+        _essay_grid_z = ndtri(np.clip(essay_pct, eps, 1.0 - eps))
     if _colleges is None:
         with open("schools.json", "r") as f:
             _colleges = json.load(f)
+        # Cache per-school values once so get_probability doesn't rebuild the
+        # acceptance-rate dict (and re-run inv_cdf) on every call
+        _acc_rate_lookup = {c["name"]: c["acceptance_rate"] / 100 for c in _colleges}
+        _z_school_lookup = {
+            name: float(ndtri(1 - rate)) for name, rate in _acc_rate_lookup.items()
+        }
+        # Tabulate admission probability per school over the z_student grid so
+        # hot callers (MCTS rollouts) never touch the cdf at query time
+        z_grid = _Z_GRID_LO + _Z_GRID_STEP * np.arange(_Z_GRID_SIZE)
+        _admit_table = {
+            name: 1 - norm.cdf((z_school - z_grid) / 0.5)
+            for name, z_school in _z_school_lookup.items()
+        }
     if _sat_lookup is None:
         _sat_lookup = {}
         with open("sat_percentiles.csv", "r", newline="") as f:
@@ -95,11 +213,16 @@ def _load_data():
                 score = int(row["score"])
                 percentile = int(row["percentile"])
                 _sat_lookup[score] = percentile
+        # SAT scores form a small discrete domain, so precompute the clamped
+        # z-score per score and skip the inv_cdf on every probability call
+        _sat_z_lookup = {
+            score: float(ndtri(min(1.0 - 1e-6, max(1e-6, pct / 100.0))))
+            for score, pct in _sat_lookup.items()
+        }
 
 
 if __name__ == "__main__":
-    # Testing probability
-    _load_data()
+    # Testing probability (data loads lazily on the first call)
     # highly competitive student, highly competitive school
     test1 = get_probability("Harvard University", 1550, 0.99, 1150)
     print(f"Competitive student at Harvard: {test1}")
@@ -0,0 +1,43 @@
+"""Shared Parquet loading helpers for the analysis scripts.
+
+All reads go through pyarrow with memory_map=True, so repeated runs over the
+same dump reuse the OS page cache instead of re-reading from disk, and the
+Arrow buffers reference the mapped file rather than copied allocations.
+"""
+
+import glob
+import os
+
+import pyarrow.parquet as pq
+
+
+def find_latest_dump(data_dir="data_dump"):
+    """
+    Return (essays, prompts, schools) paths for the latest dump in data_dir,
+    or None if no essay parquet files exist.
+    """
+    essays_files = glob.glob(os.path.join(data_dir, "*_essays.parquet"))
+    if not essays_files:
+        return None
+    # Sort by timestamp (embedded in filename) and pick the latest
+    latest_essays = sorted(essays_files)[-1]
+    return (
+        latest_essays,
+        latest_essays.replace("_essays.parquet", "_prompts.parquet"),
+        latest_essays.replace("_essays.parquet", "_schools.parquet"),
+    )
+
+
+def count_rows(path):
+    """Row count straight from the Parquet footer metadata (no data read)."""
+    return pq.ParquetFile(path).metadata.num_rows
+
+
+def load_table(path, columns=None, filters=None):
+    """Read a Parquet file as a memory-mapped Arrow table."""
+    return pq.read_table(path, columns=columns, filters=filters, memory_map=True)
+
+
+def to_pandas(table):
+    """Convert an Arrow table to pandas without duplicating its buffers."""
+    return table.to_pandas(split_blocks=True, self_destruct=True)
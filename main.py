@@ -44,6 +44,11 @@ def __main__():
                 {"score": 1210, "hours": 6},
             ],
         },
+        "total_hours_by_school": {
+            "Harvard University": 4,
+            "Columbia University": 2,
+            "Stanford University": 6,
+        },
     }
     best_action = mcts_search(
         student,
@@ -1,11 +1,11 @@
 from typing import List, Dict, Optional, Tuple
 import math
 import random
-import copy
 import time
 import numpy as np
-from models import School, Student, expected_essay_improvement, school_reward
-from calculate_college_probability import get_probability
+from numba import njit
+from models import School, Student, expected_essay_improvement
+from calculate_college_probability import fast_probability, get_probability_vec
 
 
 MAX_HOURS_PER_SCHOOL = 20.0
@@ -14,14 +14,37 @@ STOP_ACTION = "STOP"
 DEFAULT_TIME_LIMIT = 15.0  # seconds
 DEFAULT_EXPLORATION_WEIGHT = 1.41
 DEFAULT_EXPLOITATION_WEIGHT = 1.0
+# Independent rollouts run per selected leaf (batched leaf evaluation);
+# their rewards are averaged into one backpropagation of NUM_ROLLOUTS_PER_LEAF
+# visits. Run sequentially: the rollout path holds the GIL throughout, so a
+# thread pool would only add dispatch overhead
+NUM_ROLLOUTS_PER_LEAF = 8
+# Progressive widening: a node may have at most ceil(C * sqrt(visits))
+# children, so simulations concentrate on the heuristically best actions and
+# widen as the node proves worth visiting. The root is exempt — its first
+# layer is still fully expanded up front.
+WIDENING_C = 1.5
+# Per-expansion / per-phase progress printing; the end-of-search summary is
+# always printed
+DEBUG = False
 
 
 def get_total_hours(student: Student, school_name: str) -> float:
     """Get total hours spent on a school's essay"""
-    history = student["application_score_history"].get(school_name, [])
-    if not history:
-        return 0.0
-    return max(point["hours"] for point in history)
+    return student["total_hours_by_school"].get(school_name, 0.0)
+
+
+def init_total_hours(student: Student) -> None:
+    """
+    Populate total_hours_by_school from the score history for students built
+    without the running totals (e.g. hand-written test states).
+    """
+    if "total_hours_by_school" not in student:
+        student["total_hours_by_school"] = {
+            school_name: max(point["hours"] for point in history)
+            for school_name, history in student["application_score_history"].items()
+            if history
+        }
 
 
 def available_actions(student: Student, schools_data: List[School]) -> List[str]:
@@ -39,35 +62,36 @@ def available_actions(student: Student, schools_data: List[School]) -> List[str]
 
 
 def copy_student(student: Student) -> Student:
-    """Deep copy a student"""
+    """
+    Copy a student. Shallow per-field dict copies are enough here:
+    apply_action copies the one school history list it appends to, so sibling
+    states never share a mutated container and the deep copy of the whole
+    nested structure is wasted work.
+    """
     return {
         "sat_score": student["sat_score"],
         "gpa": student["gpa"],
         "gpa_percentile": student["gpa_percentile"],
-        "application_scores": copy.deepcopy(student["application_scores"]),
-        "application_score_history": copy.deepcopy(
-            student["application_score_history"]
-        ),
+        "application_scores": dict(student["application_scores"]),
+        "application_score_history": dict(student["application_score_history"]),
+        "total_hours_by_school": dict(student["total_hours_by_school"]),
     }
 
 
-def copy_schools(schools_data: List[School]) -> List[School]:
-    """Deep copy schools data"""
-    return copy.deepcopy(schools_data)
-
-
 def apply_action(
     student: Student, schools_data: List[School], action: str
 ) -> Tuple[Student, List[School], float]:
     """
     Apply an action and return new state + immediate cost
-    Returns: (new_student, new_schools_data, hours_spent)
+    Returns: (new_student, schools_data, hours_spent)
+
+    schools_data is never mutated by the search, so it is shared by reference
+    across all nodes instead of deep-copied per action.
     """
     new_student = copy_student(student)
-    new_schools = copy_schools(schools_data)
 
     if action == STOP_ACTION:
-        return new_student, new_schools, 0.0
+        return new_student, schools_data, 0.0
 
     hours_spent = 2.0
     history = new_student["application_score_history"].get(action, [])
@@ -76,15 +100,56 @@ def apply_action(
     current_hours = get_total_hours(new_student, action)
     new_hours = current_hours + hours_spent
 
-    if action not in new_student["application_score_history"]:
-        new_student["application_score_history"][action] = []
-    new_student["application_score_history"][action].append(
-        {"hours": new_hours, "score": new_score}
-    )
+    # Copy-on-write: only the one history list this action touches is copied
+    history = list(history)
+    history.append({"hours": new_hours, "score": new_score})
+    new_student["application_score_history"][action] = history
 
     new_student["application_scores"][action] = new_score
+    new_student["total_hours_by_school"][action] = new_hours
+
+    return new_student, schools_data, hours_spent
+
+
+# log(n) lookup table for the UCB1 exploration term: parent visit counts are
+# small integers hit thousands of times per second during selection, so one
+# vectorized np.log at import replaces a math.log call per selection step
+_LOGN_SIZE = 1 << 20
+_LOGN = np.log(np.arange(1, _LOGN_SIZE + 1, dtype=np.float64))
+
 
-    return new_student, new_schools, hours_spent
+# Expected rewards memoized by state: rollouts from similar trajectories hit
+# the same (scores, hours) leaves over and over, and re-sampling them buys
+# nothing. Cleared at the start of each search since the cached values also
+# depend on the student profile and schools list.
+_reward_cache: Dict[Tuple, float] = {}
+
+
+@njit
+def _mc_reward_kernel(
+    probabilities: np.ndarray, desire: np.ndarray, num_samples: int, l: float
+) -> float:
+    """
+    Monte Carlo estimate of the admission reward, compiled to native code.
+    Draws Bernoulli admissions per school and applies the diminishing-returns
+    reward (best admitted school at full value, the rest scaled by l) sample
+    by sample, so no (num_samples, num_schools) scratch matrix is allocated.
+    """
+    num_schools = probabilities.shape[0]
+    total = 0.0
+    for _ in range(num_samples):
+        top = 0.0
+        rest = 0.0
+        for j in range(num_schools):
+            if np.random.random() < probabilities[j]:
+                d = desire[j]
+                if d > top:
+                    rest += top
+                    top = d
+                else:
+                    rest += d
+        total += top + l * rest
+    return total / num_samples
 
 
 def calculate_expected_reward(
@@ -96,125 +161,263 @@ def calculate_expected_reward(
     """
     num_samples = 1000
 
+    cache_key = (
+        tuple(sorted(student["application_scores"].items())),
+        round(total_hours_spent, 3),
+    )
+    cached = _reward_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     applying_schools = [school for school in schools_data if school["applying"]]
     if not applying_schools:
         time_cost = COST_PER_HOUR * total_hours_spent
         return time_cost
 
-    num_schools = len(applying_schools)
+    # Struct-of-arrays view of the applying schools: essay scores and
+    # desirabilities as contiguous arrays so sampling runs on NumPy buffers
+    # instead of per-sample name lists and dict lookups
     school_names = [school["name"] for school in applying_schools]
-
-    probabilities = np.array(
-        [
-            get_probability(
-                school_name,
-                student["sat_score"],
-                student["gpa_percentile"],
-                student["application_scores"].get(school_name, 700),
-            )
-            for school_name in school_names
-        ]
+    scores = student["application_scores"]
+    essay_scores = np.array(
+        [scores.get(school_name, 700) for school_name in school_names],
+        dtype=np.float64,
+    )
+    desire = np.array(
+        [school["desireability"] for school in applying_schools], dtype=np.float64
     )
 
-    random_values = np.random.random((num_samples, num_schools))
-
-    admitted_mask = random_values < probabilities
-
-    total_reward = 0.0
-    for sample_idx in range(num_samples):
-        admitted_schools = [
-            school_names[i] for i in range(num_schools) if admitted_mask[sample_idx, i]
-        ]
-        sample_reward = school_reward(admitted_schools, schools_data)
-        total_reward += sample_reward
+    probabilities = get_probability_vec(
+        school_names,
+        student["sat_score"],
+        student["gpa_percentile"],
+        essay_scores,
+    )
 
-    expected_reward = total_reward / num_samples
+    # Same diminishing-returns reward as models.school_reward (l=0.1),
+    # estimated inside the Numba kernel
+    expected_reward = float(_mc_reward_kernel(probabilities, desire, num_samples, 0.1))
 
     # Subtract time cost
     time_cost = COST_PER_HOUR * total_hours_spent
 
-    return expected_reward + time_cost
+    result = expected_reward + time_cost
+    _reward_cache[cache_key] = result
+    return result
+
 
+class MCTSTree:
+    """
+    Pre-allocated node arena for the search tree.
+
+    Node statistics live in parallel arrays indexed by node id instead of in
+    per-node Python objects: backpropagation is a tight walk over the parent
+    index array and selection reads one contiguous child slice, with no
+    attribute lookups or heap allocation per visited node. When a node is
+    first expanded a block for all of its eventual children is reserved up
+    front, so every node's children occupy the slice
+    [first_child, first_child + num_children). Arrays grow by doubling when
+    the arena fills. Per-node Python payloads (student state, action labels,
+    untried actions) stay in plain lists indexed the same way.
+
+    A transposition table maps canonical (application scores, total hours)
+    states to node ids: action order commutes, so different orderings of the
+    same essay work reach the same state. A child slot stores the id of the
+    canonical node for its state (usually itself), turning the tree into a
+    DAG whose shared nodes pool their visit statistics. Because a shared node
+    has several parents, rewards are backpropagated along the explicit
+    root-to-leaf path of each simulation rather than by following parent
+    links.
+    """
+
+    ROOT = 0
 
-class MCTSNode:
     def __init__(
+        self, student: Student, schools_data: List[School], capacity: int = 4096
+    ):
+        self.schools_data = schools_data
+        self._school_by_name = {school["name"]: school for school in schools_data}
+        self.capacity = capacity
+        self.visits = np.zeros(capacity, dtype=np.int32)
+        # log(visits) maintained during backpropagation so selection never
+        # computes a logarithm
+        self.log_visits = np.zeros(capacity, dtype=np.float64)
+        self.total_reward = np.zeros(capacity, dtype=np.float64)
+        self.parent = np.full(capacity, -1, dtype=np.int32)
+        # Node id occupying each reserved child slot; on a transposition hit
+        # the slot points at the canonical node instead of itself
+        self.child_ids = np.full(capacity, -1, dtype=np.int32)
+        self.first_child = np.full(capacity, -1, dtype=np.int32)
+        self.num_children = np.zeros(capacity, dtype=np.int32)
+        self.terminal = np.zeros(capacity, dtype=np.bool_)
+        self.students: List[Optional[Student]] = [None] * capacity
+        self.hours: List[float] = [0.0] * capacity
+        self.actions: List[Optional[str]] = [None] * capacity
+        self.untried: List[Optional[List[str]]] = [None] * capacity
+        self.size = 0
+        self.trans: Dict[Tuple, int] = {}
+        self._fill(self._reserve(1), student, 0.0, -1, None)
+
+    def _grow(self, need: int) -> None:
+        new_capacity = self.capacity
+        while new_capacity < need:
+            new_capacity *= 2
+
+        def grown(arr: np.ndarray, fill) -> np.ndarray:
+            out = np.full(new_capacity, fill, dtype=arr.dtype)
+            out[: self.capacity] = arr
+            return out
+
+        self.visits = grown(self.visits, 0)
+        self.log_visits = grown(self.log_visits, 0.0)
+        self.total_reward = grown(self.total_reward, 0.0)
+        self.parent = grown(self.parent, -1)
+        self.child_ids = grown(self.child_ids, -1)
+        self.first_child = grown(self.first_child, -1)
+        self.num_children = grown(self.num_children, 0)
+        self.terminal = grown(self.terminal, False)
+        extra = new_capacity - self.capacity
+        self.students.extend([None] * extra)
+        self.hours.extend([0.0] * extra)
+        self.actions.extend([None] * extra)
+        self.untried.extend([None] * extra)
+        self.capacity = new_capacity
+
+    def _reserve(self, count: int) -> int:
+        """Reserve `count` contiguous node slots, returning the first index"""
+        start = self.size
+        if start + count > self.capacity:
+            self._grow(start + count)
+        self.size = start + count
+        return start
+
+    def _fill(
         self,
+        idx: int,
         student: Student,
-        schools_data: List[School],
-        total_hours_spent: float = 0.0,
-        parent: Optional["MCTSNode"] = None,
-        action: Optional[str] = None,
-    ):
-        self.student: Student = student
-        self.schools_data: List[School] = schools_data
-        self.total_hours_spent: float = total_hours_spent
-        self.parent: Optional[MCTSNode] = parent
-        self.action: Optional[str] = action
-        self.children: List[MCTSNode] = []
-        self.visits: int = 0
-        self.total_reward: float = 0.0
-        self.untried_actions: List[str] = available_actions(student, schools_data)
-
-    def is_terminal(self) -> bool:
-        """Check if node is terminal (no more actions or STOP was taken)"""
-        if self.action == STOP_ACTION:
-            return True
+        total_hours_spent: float,
+        parent_idx: int,
+        action: Optional[str],
+    ) -> int:
+        self.students[idx] = student
+        self.hours[idx] = total_hours_spent
+        self.actions[idx] = action
+        self.parent[idx] = parent_idx
+        untried = available_actions(student, self.schools_data)
+        # Priority-order the untried actions (ascending, since expand pops
+        # from the end): desirable schools whose admission is still unlikely
+        # have the most to gain from essay work; STOP sorts last
+        untried.sort(key=lambda a: self._action_priority(student, a))
+        self.untried[idx] = untried
+        # Node state is immutable, so terminality is computed once here:
+        # terminal when STOP was taken or only STOP remains
+        self.terminal[idx] = action == STOP_ACTION or len(untried) == 1
+        # STOP leaves the state unchanged, so STOP children would collide
+        # with their parent's key; they stay out of the transposition table
+        if action != STOP_ACTION:
+            self.trans[self._state_key(student, total_hours_spent)] = idx
+        return idx
+
+    @staticmethod
+    def _state_key(student: Student, total_hours_spent: float) -> Tuple:
         return (
-            len(available_actions(self.student, self.schools_data)) == 1
-        )  # Only STOP left
+            frozenset(student["application_scores"].items()),
+            round(total_hours_spent, 2),
+        )
+
+    def _action_priority(self, student: Student, action: str) -> float:
+        """Cheap expansion heuristic: desirability weighted by how far the
+        school currently is from a likely admit (table lookups only)"""
+        if action == STOP_ACTION:
+            return 0.0
+        school = self._school_by_name[action]
+        essay_score = student["application_scores"].get(action, 700)
+        return school["desireability"] * (
+            1.0
+            - fast_probability(
+                action, student["sat_score"], student["gpa_percentile"], essay_score
+            )
+        )
 
-    def is_fully_expanded(self) -> bool:
+    def is_terminal(self, idx: int) -> bool:
+        """Check if node is terminal (no more actions or STOP was taken)"""
+        return bool(self.terminal[idx])
+
+    def is_fully_expanded(self, idx: int) -> bool:
         """Check if all actions have been tried"""
-        return len(self.untried_actions) == 0
+        return len(self.untried[idx]) == 0
+
+    def can_expand(self, idx: int) -> bool:
+        """Untried actions remain and the progressive-widening cap allows
+        another child"""
+        if not self.untried[idx]:
+            return False
+        if idx == self.ROOT:
+            return True
+        cap = math.ceil(WIDENING_C * math.sqrt(self.visits[idx]))
+        return int(self.num_children[idx]) < cap
 
     def best_child(
         self,
+        idx: int,
         exploration_weight: float = DEFAULT_EXPLORATION_WEIGHT,
         exploitation_weight: float = DEFAULT_EXPLOITATION_WEIGHT,
-    ) -> "MCTSNode":
-        """Select best child using UCB1 formula"""
-        choices_weights = []
-        for child in self.children:
-            if child.visits == 0:
-                ucb_value = float("inf")
-            else:
-                exploitation = exploitation_weight * (child.total_reward / child.visits)
-                exploration = exploration_weight * math.sqrt(
-                    math.log(self.visits) / child.visits
-                )
-                ucb_value = exploitation + exploration
-            choices_weights.append((child, ucb_value))
-
-        return max(choices_weights, key=lambda x: x[1])[0]
-
-    def expand(self) -> "MCTSNode":
-        """Expand node by trying an untried action"""
-        action = self.untried_actions.pop()
-        new_student, new_schools, hours_spent = apply_action(
-            self.student, self.schools_data, action
-        )
-        child_node = MCTSNode(
-            new_student,
-            new_schools,
-            self.total_hours_spent + hours_spent,
-            parent=self,
-            action=action,
+    ) -> int:
+        """Select best child using UCB1 formula (vectorized over the child slice)"""
+        first = int(self.first_child[idx])
+        last = first + int(self.num_children[idx])
+        ids = self.child_ids[first:last]
+        log_parent_visits = self.log_visits[idx]
+
+        child_visits = self.visits[ids]
+        # Clamp the divisor so the unvisited branch of np.where never divides
+        # by zero; those entries are overwritten with inf anyway
+        safe_visits = np.maximum(child_visits, 1)
+        ucb = np.where(
+            child_visits == 0,
+            np.inf,
+            exploitation_weight * (self.total_reward[ids] / safe_visits)
+            + exploration_weight * np.sqrt(log_parent_visits / safe_visits),
         )
-        self.children.append(child_node)
-        print(f"Expanded node with action: {action}")
-        return child_node
+        return int(ids[int(np.argmax(ucb))])
 
-    def rollout(self) -> float:
+    def expand(self, idx: int) -> int:
+        """Expand node by trying an untried action"""
+        untried = self.untried[idx]
+        action = untried.pop()
+        if self.first_child[idx] == -1:
+            # Reserve one contiguous block for every eventual child so
+            # selection can always read a single slice
+            self.first_child[idx] = self._reserve(len(untried) + 1)
+        slot = int(self.first_child[idx]) + int(self.num_children[idx])
+        new_student, _, hours_spent = apply_action(
+            self.students[idx], self.schools_data, action
+        )
+        total_hours = self.hours[idx] + hours_spent
+        # Reuse the canonical node if another action ordering already reached
+        # this state, pooling its statistics instead of growing a twin subtree
+        child = -1
+        if action != STOP_ACTION:
+            child = self.trans.get(self._state_key(new_student, total_hours), -1)
+        if child == -1:
+            child = self._fill(slot, new_student, total_hours, idx, action)
+        self.child_ids[slot] = child
+        self.num_children[idx] += 1
+        if DEBUG:
+            print(f"Expanded node with action: {action}")
+        return child
+
+    def rollout(self, idx: int) -> float:
         """Simulate random playout from this node"""
         # If we've already chosen to stop or have no remaining actions, evaluate immediately
-        if self.is_terminal():
+        if self.is_terminal(idx):
             return calculate_expected_reward(
-                self.student, self.schools_data, self.total_hours_spent
+                self.students[idx], self.schools_data, self.hours[idx]
             )
 
-        current_student = copy_student(self.student)
-        current_schools = copy_schools(self.schools_data)
-        current_hours = self.total_hours_spent
+        current_student = copy_student(self.students[idx])
+        current_schools = self.schools_data
+        current_hours = self.hours[idx]
 
         # Random policy until terminal
         while True:
@@ -235,13 +438,24 @@ class MCTSNode:
             current_student, current_schools, current_hours
         )
 
-    def backpropagate(self, reward: float) -> None:
-        """Backpropagate reward up the tree"""
-        node = self
-        while node is not None:
-            node.visits += 1
-            node.total_reward += reward
-            node = node.parent
+    def backpropagate(self, path: List[int], reward: float, count: int = 1) -> None:
+        """
+        Backpropagate reward along the root-to-leaf path of this simulation.
+        `reward` is the summed reward of `count` rollouts, so parallel leaf
+        evaluations update the statistics in one walk. Transposition-shared
+        nodes have several parents, so the explicit path — not the parent
+        links — decides which ancestors are credited.
+        """
+        visits = self.visits
+        log_visits = self.log_visits
+        total_reward = self.total_reward
+        for node in path:
+            visits[node] += count
+            v = int(visits[node])
+            # Refresh the cached log(visits) here — once per visit-count
+            # change — instead of in every best_child call
+            log_visits[node] = _LOGN[v - 1] if v <= _LOGN_SIZE else math.log(v)
+            total_reward[node] += reward
 
 
 def mcts_search(
@@ -264,62 +478,81 @@ def mcts_search(
     Returns:
         Best action (school name or STOP)
     """
-    root = MCTSNode(student, schools_data)
-    start_time = time.time()
+    _reward_cache.clear()
+    init_total_hours(student)
+    tree = MCTSTree(student, schools_data)
+    root = MCTSTree.ROOT
+    start_time = time.monotonic()
+    deadline = start_time + time_limit
     iteration = 0
 
+    def evaluate_leaf(path: List[int]) -> None:
+        # Batched leaf evaluation: independent rollouts of the same leaf,
+        # backpropagated as one batch of visits
+        leaf = path[-1]
+        rewards = sum(tree.rollout(leaf) for _ in range(NUM_ROLLOUTS_PER_LEAF))
+        tree.backpropagate(path, rewards, NUM_ROLLOUTS_PER_LEAF)
+
     # Fully explore first layer (all direct children of root)
-    print("Fully exploring first layer...")
-    while not root.is_fully_expanded():
-        node = root.expand()
-        reward = node.rollout()
-        node.backpropagate(reward)
+    if DEBUG:
+        print("Fully exploring first layer...")
+    while not tree.is_fully_expanded(root):
+        node = tree.expand(root)
+        evaluate_leaf([root, node])
         iteration += 1
 
-        if time.time() - start_time >= time_limit:
+        if time.monotonic() >= deadline:
             print(f"Time limit reached after {iteration} iterations")
             break
 
-    print(
-        f"First layer fully explored with {len(root.children)} children after {iteration} iterations"
-    )
-
-    print("Continuing MCTS search...")
-    while time.time() - start_time < time_limit:
+    if DEBUG:
+        print(
+            f"First layer fully explored with {int(tree.num_children[root])} children after {iteration} iterations"
+        )
+        print("Continuing MCTS search...")
+    # Amortize the clock syscall: check the deadline every 64 iterations.
+    # time.monotonic() is immune to wall-clock adjustments mid-search.
+    while True:
+        if iteration & 63 == 0 and time.monotonic() >= deadline:
+            break
         node = root
+        path = [root]
 
-        # Selection
-        while not node.is_terminal() and node.is_fully_expanded():
-            node = node.best_child(exploration_weight, exploitation_weight)
+        # Selection: descend while the widening cap blocks a new child
+        while not tree.is_terminal(node) and not tree.can_expand(node):
+            node = tree.best_child(node, exploration_weight, exploitation_weight)
+            path.append(node)
 
         # Expansion
-        if not node.is_terminal() and not node.is_fully_expanded():
-            node = node.expand()
+        if not tree.is_terminal(node) and tree.can_expand(node):
+            node = tree.expand(node)
+            path.append(node)
 
-        # Simulation
-        reward = node.rollout()
-
-        # Backpropagation
-        node.backpropagate(reward)
+        # Simulation + backpropagation
+        evaluate_leaf(path)
         iteration += 1
 
-    elapsed_time = time.time() - start_time
+    elapsed_time = time.monotonic() - start_time
     print(f"MCTS completed: {iteration} total iterations in {elapsed_time:.2f}s")
 
-    if not root.children:
+    first = int(tree.first_child[root])
+    root_children = [
+        int(c) for c in tree.child_ids[first : first + int(tree.num_children[root])]
+    ]
+    if not root_children:
         return STOP_ACTION
 
-    best_child = max(
-        root.children, key=lambda c: c.total_reward / c.visits if c.visits > 0 else 0
-    )
+    def average_reward(child: int) -> float:
+        child_visits = int(tree.visits[child])
+        return tree.total_reward[child] / child_visits if child_visits > 0 else 0
+
+    best_child = max(root_children, key=average_reward)
 
     print("\nFirst layer statistics:")
-    for child in sorted(
-        root.children,
-        key=lambda c: c.total_reward / c.visits if c.visits > 0 else 0,
-        reverse=True,
-    ):
-        avg_reward = child.total_reward / child.visits if child.visits > 0 else 0
-        print(f"  {child.action}: visits={child.visits}, avg_reward={avg_reward:.2f}")
+    for child in sorted(root_children, key=average_reward, reverse=True):
+        print(
+            f"  {tree.actions[child]}: visits={int(tree.visits[child])}, "
+            f"avg_reward={average_reward(child):.2f}"
+        )
 
-    return best_child.action or STOP_ACTION
+    return tree.actions[best_child] or STOP_ACTION
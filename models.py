@@ -1,6 +1,7 @@
-from typing import List, Dict, TypedDict
+from functools import lru_cache
+from typing import List, Dict, Tuple, TypedDict
 import numpy as np
-from scipy.optimize import curve_fit
+from numba import njit
 
 
 class School(TypedDict):
@@ -17,6 +18,39 @@ class Student(TypedDict):
     gpa_percentile: float
     application_scores: Dict[str, float]
     application_score_history: Dict[str, List[Dict[str, float]]]
+    # Running total hours per school, maintained on every action so lookups
+    # don't rescan the score history
+    total_hours_by_school: Dict[str, float]
+
+
+# Structure-of-arrays view of schools_data for the reward kernel: a
+# name -> index map plus a contiguous desirability array. Built lazily and
+# keyed on the identity of the schools list it was built from (the kept
+# reference also stops the id from being recycled), so each call is
+# answered from the schools_data it was actually handed. An unknown name
+# still forces a rebuild in case the same list was mutated in place.
+_cached_schools: List[School] = []
+_name_to_idx: Dict[str, int] = {}
+_desireability: np.ndarray = np.empty(0, dtype=np.float64)
+
+
+def _build_school_index(schools_data: List[School]) -> None:
+    global _cached_schools, _name_to_idx, _desireability
+    _cached_schools = schools_data
+    _name_to_idx = {school["name"]: i for i, school in enumerate(schools_data)}
+    _desireability = np.array(
+        [school["desireability"] for school in schools_data], dtype=np.float64
+    )
+
+
+@njit
+def _reward_kernel(idx_arr: np.ndarray, desire: np.ndarray, l: float) -> float:
+    # Best school at full value, the rest as one discounted reduction.
+    # Only the maximum is treated specially, so max + sum replaces the
+    # O(A log A) sort entirely
+    v = desire[idx_arr]
+    top = np.max(v)
+    return top + l * (np.sum(v) - top)
 
 
 def school_reward(
@@ -26,24 +60,27 @@ def school_reward(
     returns a numerical reward based on the list of admitted schools
     l controls the diminishing returns factor for multiple schools
     """
-    admitted_schools_data: List[School] = []
-    for school_name in admitted_schools:
-        for school in schools_data:
-            if school["name"] == school_name:
-                admitted_schools_data.append(school)
-                break
-
-    admitted_schools_data.sort(key=lambda x: x["desireability"], reverse=True)
-
-    r = (
-        admitted_schools_data[0]["desireability"]
-        if len(admitted_schools_data) > 0
-        else 0
-    )
-    for school in admitted_schools_data[1:]:
-        r += school["desireability"] * l
+    if not admitted_schools:
+        return 0.0
 
-    return r
+    if schools_data is not _cached_schools:
+        _build_school_index(schools_data)
+    try:
+        idx_arr = np.array(
+            [_name_to_idx[name] for name in admitted_schools], dtype=np.int64
+        )
+    except KeyError:
+        # Unknown school name: rebuild in case the cached list was mutated
+        # in place, then skip any names genuinely absent from schools_data
+        # (the pre-index linear scan just ignored them too)
+        _build_school_index(schools_data)
+        indices = [
+            idx for name in admitted_schools if (idx := _name_to_idx.get(name)) is not None
+        ]
+        if not indices:
+            return 0.0
+        idx_arr = np.array(indices, dtype=np.int64)
+    return float(_reward_kernel(idx_arr, _desireability, l))
 
 
 def expected_essay_improvement(essay_score_history: List[Dict[str, float]]) -> float:
@@ -66,37 +103,35 @@ def expected_essay_improvement(essay_score_history: List[Dict[str, float]]) -> f
         slope = (s1 - s0) / (max(1e-6, h1 - h0))
         return s1 + slope * 2.0
 
-    hours: np.ndarray = np.array(
-        [point["hours"] for point in essay_score_history], dtype=float
-    )
-    scores: np.ndarray = np.array(
-        [point["score"] for point in essay_score_history], dtype=float
+    # Rollouts from a given node share history prefixes, so the same
+    # (hours, scores) series gets fit over and over — memoize on the tuples
+    return _fit_log_projection(
+        tuple(round(point["hours"], 4) for point in essay_score_history),
+        tuple(round(point["score"], 4) for point in essay_score_history),
     )
 
+
+@lru_cache(maxsize=50_000)
+def _fit_log_projection(
+    hours_tuple: Tuple[float, ...], scores_tuple: Tuple[float, ...]
+) -> float:
+    """Fit the log curve to one (hours, scores) series and project 2 hours out"""
+    hours: np.ndarray = np.array(hours_tuple, dtype=float)
+    scores: np.ndarray = np.array(scores_tuple, dtype=float)
+
     # Shift hours so log arguments stay positive
     min_shift: float = max(0.0, 1e-3 - float(np.min(hours)))
     hours_shifted: np.ndarray = hours + min_shift
 
-    def log_curve(x: np.ndarray, a: float, b: float, c: float) -> np.ndarray:
-        return a * np.log(x + b) + c
-
-    # Constrain b to keep x + b > 0; allow more iterations to converge
-    lower_bounds: List[float] = [-np.inf, 1e-3, -np.inf]
-    upper_bounds: List[float] = [np.inf, np.inf, np.inf]
-    initial_guess: List[float] = [10.0, 1.0, float(np.mean(scores))]
-
     try:
-        params, _ = curve_fit(
-            log_curve,
-            hours_shifted,
-            scores,
-            p0=initial_guess,
-            bounds=(lower_bounds, upper_bounds),
-            maxfev=5000,
-        )
+        # Fix the log offset at b=1 so score ~ a*log(hours + 1) + c is linear
+        # in (a, c) and solvable in closed form — no iterative optimizer
+        x: np.ndarray = np.log(hours_shifted + 1.0)
+        coeffs, *_ = np.linalg.lstsq(np.c_[x, np.ones_like(x)], scores, rcond=None)
+        a, c = coeffs
         current_hours: float = float(np.max(hours_shifted))
         future_hours: float = current_hours + 2.0
-        projected_score: float = float(log_curve(future_hours, *params))
+        projected_score: float = float(a * np.log(future_hours + 1.0) + c)
     except Exception:
         # Fallback: simple linear extrapolation
         total_hours_spent: float = float(hours[-1] - hours[0])
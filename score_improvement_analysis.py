@@ -1,126 +1,42 @@
 import pandas as pd
-import glob
-import os
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 import numpy as np
 
-# Step 1: Load the latest parquet files
+from common_pipeline import load_prepared
+
+# Step 1: Load the latest parquet files and run the shared pipeline
+# (column projection, word-count pushdown, Common App + edit-window filter,
+# average esslo_ score, per-user first dates)
 print("Step 1: Loading data...")
 print("=" * 60)
 
-data_dir = "data_dump"
-essays_files = glob.glob(os.path.join(data_dir, "*_essays.parquet"))
-if not essays_files:
+common_app_essays = load_prepared()
+if common_app_essays is None:
     print("No essay parquet files found!")
     exit(1)
 
-# Sort by timestamp and pick the latest
-latest_essays = sorted(essays_files)[-1]
-latest_prompts = latest_essays.replace("_essays.parquet", "_prompts.parquet")
-latest_schools = latest_essays.replace("_essays.parquet", "_schools.parquet")
-
-print(f"Loading data from:")
-print(f"  Essays: {latest_essays}")
-print(f"  Prompts: {latest_prompts}")
-print()
-
-# Load the parquet files
-essays_df = pd.read_parquet(latest_essays)
-prompts_df = pd.read_parquet(latest_prompts)
-
-print(f"Total essays loaded: {len(essays_df)}")
-print(f"Total prompts loaded: {len(prompts_df)}")
-print()
-
-# Join essays with prompts to get application type
-essays_with_prompts = essays_df.merge(
-    prompts_df[["prompt_id", "application"]], on="prompt_id", how="left"
-)
-
-# Filter for Common App essays only (including COMMON_APP_ASSUMED which lack prompt_id)
-common_app_essays = essays_with_prompts[
-    (essays_with_prompts["application"] == "COMMON_APP")
-    | (essays_with_prompts["application"] == "COMMON_APP_ASSUMED")
-].copy()
-
-print(
-    f"Common App essays found (COMMON_APP + COMMON_APP_ASSUMED): {len(common_app_essays)}"
-)
-print(f"  - COMMON_APP: {(common_app_essays['application'] == 'COMMON_APP').sum()}")
-print(
-    f"  - COMMON_APP_ASSUMED: {(common_app_essays['application'] == 'COMMON_APP_ASSUMED').sum()}"
-)
-
-# Filter out essays where last_modified is more than 3 days after created_date
-max_edit_window_days = 3
-common_app_essays["days_to_modify"] = (
-    common_app_essays["last_modified"] - common_app_essays["created_date"]
-).dt.days
-
-essays_before_edit_filter = len(common_app_essays)
-common_app_essays = common_app_essays[
-    common_app_essays["days_to_modify"] <= max_edit_window_days
-].copy()
-
-essays_filtered_by_edit = essays_before_edit_filter - len(common_app_essays)
-print(
-    f"Filtered out essays with >3 days between created and modified: {essays_filtered_by_edit} essays"
-)
-print(f"Common App essays remaining: {len(common_app_essays)}")
-print()
-
-# Filter for essays between 600 and 650 words
-min_word_count = 600
-max_word_count = 650
-common_app_essays = common_app_essays[
-    (common_app_essays["word_count"] >= min_word_count)
-    & (common_app_essays["word_count"] <= max_word_count)
-].copy()
-
-print(
-    f"Common App essays with {min_word_count}-{max_word_count} words: {len(common_app_essays)}"
-)
-print()
-
 # Step 2: Calculate per-user baselines
 print("Step 2: Calculating per-user baselines...")
 print("=" * 60)
 
-# For each user, find their first Common App essay's created_date date
-user_first_dates = common_app_essays.groupby("author_id")["created_date"].min()
-
-print(f"Number of unique users: {len(user_first_dates)}")
+num_users = common_app_essays["author_id"].nunique()
+print(f"Number of unique users: {num_users}")
 print()
 
-# Calculate days_since_first for each essay
-common_app_essays["user_first_date"] = common_app_essays["author_id"].map(
-    user_first_dates
-)
+# Calculate days_since_first for each essay: floor-divide the raw int64
+# nanosecond views directly, skipping the timedelta intermediate and the
+# .dt.days accessor
 common_app_essays["days_since_first"] = (
-    common_app_essays["created_date"] - common_app_essays["user_first_date"]
-).dt.days
+    common_app_essays["created_date"].to_numpy(dtype="datetime64[ns]").view("i8")
+    - common_app_essays["user_first_date"].to_numpy(dtype="datetime64[ns]").view("i8")
+) // 86_400_000_000_000
 
 # Step 3: Calculate average esslo_ score for each essay
+# (computed in the shared pipeline)
 print("Step 3: Calculating average scores...")
 print("=" * 60)
 
-esslo_columns = [
-    "esslo_writing",
-    "esslo_detail",
-    "esslo_voice",
-    "esslo_character",
-    "esslo_iv",
-    "esslo_contribution",
-    "esslo_why_us",
-    "esslo_motivation",
-    "esslo_academic",
-    "esslo_experiences",
-    "esslo_reflection",
-]
-
-# Calculate mean of all esslo_ columns for each essay (ignoring NaN values)
-common_app_essays["avg_esslo_score"] = common_app_essays[esslo_columns].mean(axis=1)
-
 # Filter out essays without scores
 essays_with_scores = common_app_essays[
     common_app_essays["avg_esslo_score"].notna()
@@ -134,19 +50,18 @@ print()
 
 # Calculate improvement relative to each user's first essay
 print("Calculating improvement relative to first essay...")
-# Get each user's first essay score
+# Get each user's first essay score: one stable sort + dedup keeps each
+# user's earliest row, replacing the heavier groupby/idxmin/loc round-trip
 user_first_scores = (
-    essays_with_scores.loc[
-        essays_with_scores.groupby("author_id")["created_date"].idxmin()
-    ][["author_id", "avg_esslo_score"]]
+    essays_with_scores.sort_values("created_date", kind="stable")
+    .drop_duplicates("author_id")
     .set_index("author_id")["avg_esslo_score"]
-    .to_dict()
+    .rename("first_essay_score")
 )
 
-# Map first scores to all essays
-essays_with_scores["first_essay_score"] = essays_with_scores["author_id"].map(
-    user_first_scores
-)
+# Broadcast first scores to all essays via a hash join in C instead of a
+# per-row Python dict lookup
+essays_with_scores = essays_with_scores.join(user_first_scores, on="author_id")
 
 # Calculate improvement (current score - first score)
 essays_with_scores["score_improvement"] = (
@@ -195,17 +110,25 @@ print()
 print("Step 4: Aggregating statistics by days since first essay...")
 print("=" * 60)
 
-# Group by days_since_first and calculate statistics including unique user count
+# Group by days_since_first and calculate statistics including unique user count.
+# The three quantiles come from one native multi-quantile aggregation — the
+# former per-group quantile lambdas forced the slow Python apply path.
+# sort=False skips sorting the day keys on every aggregation; the combined
+# frame is sorted once at the end instead
+grp = essays_with_scores.groupby("days_since_first", sort=False)
+quants = grp["score_improvement"].quantile([0.25, 0.5, 0.75]).unstack()
+quants.columns = ["q1", "median", "q3"]
 time_stats = (
-    essays_with_scores.groupby("days_since_first")
-    .agg(
-        median=("score_improvement", "median"),
-        q1=("score_improvement", lambda x: x.quantile(0.25)),
-        q3=("score_improvement", lambda x: x.quantile(0.75)),
-        count=("score_improvement", "count"),
-        unique_users=("author_id", "nunique"),
+    pd.concat(
+        [
+            quants,
+            grp.size().rename("count"),
+            grp["author_id"].nunique().rename("unique_users"),
+        ],
+        axis=1,
     )
-    .reset_index()
+    .sort_index()
+    .reset_index()[["days_since_first", "median", "q1", "q3", "count", "unique_users"]]
 )
 
 print(f"Time points (days) before filtering: {len(time_stats)}")
@@ -301,7 +224,7 @@ ax.legend(fontsize=10, loc="best")
 
 # Add text box with summary statistics
 summary_text = (
-    f"Users: {len(user_first_dates)}\n"
+    f"Users: {num_users}\n"
     f"Essays: {len(essays_with_scores)}\n"
     f"Days: {time_stats_filtered['days_since_first'].min()}-{time_stats_filtered['days_since_first'].max()}\n"
     f"Min users/point: {min_users}"
@@ -326,40 +249,47 @@ print()
 print("Creating plot with individual user trajectories...")
 print("=" * 60)
 
-# Filter users who have at least 2 essays for meaningful trajectories
-user_essay_counts = essays_with_scores.groupby("author_id").size()
-users_with_multiple_essays = user_essay_counts[user_essay_counts >= 2].index
+# Filter users who have at least 2 essays for meaningful trajectories:
+# transform("size") broadcasts each user's essay count back per row in one
+# C pass, so no index of qualifying users or isin set is ever built
+user_essay_sizes = essays_with_scores.groupby("author_id", sort=False)[
+    "author_id"
+].transform("size")
 
 # Filter to users with multiple essays and within our filtered time range
 min_day = time_stats_filtered["days_since_first"].min()
 max_day = time_stats_filtered["days_since_first"].max()
 
-essays_for_user_plot = essays_with_scores[
-    (essays_with_scores["author_id"].isin(users_with_multiple_essays))
-    & (essays_with_scores["days_since_first"] >= min_day)
-    & (essays_with_scores["days_since_first"] <= max_day)
-].copy()
+essays_for_user_plot = essays_with_scores.loc[
+    (user_essay_sizes >= 2)
+    & essays_with_scores["days_since_first"].between(min_day, max_day)
+]
 
-print(
-    f"Users with 2+ essays in time range: {essays_for_user_plot['author_id'].nunique()}"
+# Sort once by (user, day): the LineCollection segments fall out of the
+# author boundaries, and the user count is just the number of runs — no
+# per-user masking, sorting or extra nunique passes
+sorted_df = essays_for_user_plot.sort_values(["author_id", "days_since_first"])
+trajectory_xy = sorted_df[["days_since_first", "score_improvement"]].to_numpy()
+trajectory_authors = sorted_df["author_id"].to_numpy()
+segment_breaks = (
+    np.flatnonzero(trajectory_authors[1:] != trajectory_authors[:-1]) + 1
 )
+user_count = len(segment_breaks) + 1 if len(trajectory_authors) else 0
+
+print(f"Users with 2+ essays in time range: {user_count}")
 print(f"Total essays for user trajectories: {len(essays_for_user_plot)}")
 
 fig2, ax2 = plt.subplots(figsize=(14, 8))
 
-# Plot individual user trajectories with transparency
-for author_id in essays_for_user_plot["author_id"].unique():
-    user_data = essays_for_user_plot[
-        essays_for_user_plot["author_id"] == author_id
-    ].sort_values("days_since_first")
-    ax2.plot(
-        user_data["days_since_first"],
-        user_data["score_improvement"],
-        color="lightgray",
+ax2.add_collection(
+    LineCollection(
+        np.split(trajectory_xy, segment_breaks),
+        colors="lightgray",
         alpha=0.4,
-        linewidth=0.7,
+        linewidths=0.7,
         zorder=1,
     )
+)
 
 # Overlay the aggregate statistics on top
 ax2.plot(
@@ -411,7 +341,6 @@ ax2.grid(True, alpha=0.3, linestyle="--", zorder=0)
 ax2.legend(fontsize=10, loc="best")
 
 # Add text box with summary statistics
-user_count = essays_for_user_plot["author_id"].nunique()
 summary_text2 = (
     f"Users shown: {user_count}\n"
     f"Essays: {len(essays_for_user_plot)}\n"
@@ -439,7 +368,7 @@ print("Plot saved as 'score_improvement_analysis_individual_users.png'")
 print()
 print("Step 6: Summary Statistics")
 print("=" * 60)
-print(f"Total users analyzed: {len(user_first_dates)}")
+print(f"Total users analyzed: {num_users}")
 print(f"Total essays analyzed: {len(essays_with_scores)}")
 print(
     f"Time range (filtered): {time_stats_filtered['days_since_first'].min()} to {time_stats_filtered['days_since_first'].max()} days"